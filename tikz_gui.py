@@ -2,24 +2,31 @@ import os
 import logging
 import queue
 import threading
+import tkinter as tk
 import customtkinter as ctk
-from PIL import Image
 import re
 from datetime import datetime
-from openai import OpenAI
 import tempfile
 import subprocess
-from PIL import Image, ImageTk
-from pdf2image import convert_from_path
 import sys
+import time
 from dotenv import load_dotenv
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import shutil
+import atexit
+import hashlib
+import shelve
+from functools import lru_cache
+from bisect import bisect_right
+from pathlib import Path
 
 # Global Constants and Configuration
 WINDOW_SIZE = "1800x1200"
 WINDOW_TITLE = "Bobby"
-UPDATE_DELAY = 500  # ms for code preview updates
+UPDATE_DELAY = 1500  # ms of idle typing before an automatic code preview update
+HIGHLIGHT_DELAY = 50  # ms of idle typing before re-highlighting edited lines
+RESIZE_DELAY = 200  # ms after the last canvas resize before the diagram is re-rasterized
 LINE_LENGTH = 60  # characters per line for message bubbles
 LOADING_INTERVAL = 700  # ms between loading indicator updates
 MIN_BUBBLE_WIDTH = 50  # minimum width for message bubbles
@@ -28,6 +35,19 @@ MAX_BUBBLE_WIDTH = 300  # maximum width for message bubbles
 FONT_SIZE = 18  # base font size for text
 LOADING_SIZE = 20  # size of loading indicator
 CHAT_WIDTH = 500  # width of chat frame
+MAX_CHAT_BUBBLES = 50  # bubbles kept as widgets before the oldest are unrealized
+CHAT_COLLAPSE_COUNT = 25  # bubbles unrealized or restored at a time
+LOADING_ROW = 1000  # grid row of the loading indicator, below every message
+INPUT_PLACEHOLDER = "Describe the diagram you want to create..."
+STREAM_FLUSH_INTERVAL = 0.1  # seconds between partial response updates
+SCROLL_DURATION = 0.2  # seconds for the chat to scroll to a new message
+CACHE_DIR = Path.home() / ".cache" / "bobby-tikz"  # rendered diagram cache
+CACHE_MAX_BYTES = 200 * 1024 * 1024  # evict oldest renders beyond this size
+RENDER_DPI = 300  # maximum resolution for rendered diagrams
+RENDER_WORKERS = 1  # one render at a time; newer requests replace the queued one
+IMAGE_CACHE_SIZE = 4  # rasterized previews kept in memory, a few MB each at canvas size
+LATEX_WORK_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else None  # RAM-backed scratch space, if any
+PDFLATEX_COMMAND = ["pdflatex", "-interaction=batchmode", "-halt-on-error", "-no-shell-escape"]
 
 # UI Colors
 DARK_BG = "#1E1E1E"
@@ -52,6 +72,22 @@ SYNTAX_PATTERNS = {
     "numbers": re.compile(r"\b\d+\.?\d*\b"),
     "curly": re.compile(r"[{}]")
 }
+# Single alternation of the patterns above; the match's group names its tag
+COMBINED_SYNTAX_PATTERN = re.compile(
+    "|".join(f"(?P<{tag}>{pattern.pattern})" for tag, pattern in SYNTAX_PATTERNS.items())
+)
+# Bound once so the highlighter does no attribute or dict lookups per pass
+SYNTAX_TAGS = tuple(SYNTAX_PATTERNS)
+SYNTAX_SCAN = COMBINED_SYNTAX_PATTERN.finditer
+NEWLINE_PATTERN = re.compile(r"\n")
+_BACKTICK_RE = re.compile(r"```(?:tikz)?\n?")
+# Fenced TikZ block of a response; a fence cut off by the token limit runs to the end
+TIKZ_BLOCK = re.compile(r"```(?:tikz|latex)[ \t\r]*\n(.*?)(?:```|\Z)", re.DOTALL)
+# First error of a pdflatex log and the source line it points at
+_LATEX_ERROR_RE = re.compile(r"^! (.*)$", re.MULTILINE)
+_LATEX_LINE_RE = re.compile(r"^l\.\d+ (.*)$", re.MULTILINE)
+# First tikzpicture environment, or everything after an unclosed \begin
+_TIKZ_RE = re.compile(r"\\begin\{tikzpicture\}.*?(?:\\end\{tikzpicture\}|\Z)", re.DOTALL)
 
 # System Prompts
 PROMPT_GENERATOR_SYSTEM_PROMPT = """You are an expert in creating detailed prompts for TikZ diagram generation.
@@ -76,6 +112,26 @@ TikZ diagrams based on their descriptions. Follow these guidelines:
 4. Ensure the diagram fits within reasonable dimensions
 """
 
+# LaTeX document wrapper for rendering TikZ code
+LATEX_TEMPLATE = r"""\documentclass[tikz,border=10pt]{standalone}
+\usepackage{tikz}
+\usepackage[dvipsnames,svgnames,x11names]{xcolor}
+\usetikzlibrary{automata,arrows,backgrounds,fit,positioning,shapes}
+
+% Define custom colors
+\definecolor{lightblue}{RGB}{173,216,230}
+\definecolor{lightred}{RGB}{255,182,193}
+\definecolor{lightgreen}{RGB}{144,238,144}
+\definecolor{lightyellow}{RGB}{255,255,224}
+\definecolor{lightgray}{RGB}{211,211,211}
+
+\begin{document}
+{content}
+\end{document}
+"""
+# Split once so each render only concatenates around the TikZ code
+LATEX_PREAMBLE, LATEX_EPILOGUE = LATEX_TEMPLATE.split("{content}")
+
 # Load environment variables
 load_dotenv() 
 
@@ -89,26 +145,299 @@ logging.basicConfig(
     ]
 )
 
+def clean_tikz_code(code):
+    """Strip Markdown fences and reduce the code to a single tikzpicture environment"""
+    code = _BACKTICK_RE.sub("", code).strip()
+    
+    match = _TIKZ_RE.search(code)
+    if match is None:
+        return "\\begin{tikzpicture}\n" + code + "\n\\end{tikzpicture}"
+    picture = match.group(0)
+    if not picture.endswith("\\end{tikzpicture}"):
+        picture += "\n\\end{tikzpicture}"
+    return picture
+
+def _latex_error_message(output):
+    """Turn pdflatex output into a user-facing error message"""
+    if "Undefined color" in output:
+        return "Error: Invalid color name used in diagram. Please use standard color names or RGB values."
+    elif "Illegal parameter" in output:
+        return "Error: Invalid TikZ parameters. Please check your node and path specifications."
+    
+    # -halt-on-error stops at the first error, so it is the one to report
+    error = _LATEX_ERROR_RE.search(output)
+    if error is None:
+        # No TeX error, e.g. a timeout or a killed run; the full log is in the debug output
+        tail = "\n".join(output.strip().splitlines()[-5:])
+        return f"Error: pdflatex failed (see log):\n{tail}"
+    line = _LATEX_LINE_RE.search(output, error.end())
+    if line is None:
+        return f"Error: {error.group(1)}"
+    return f"Error: {error.group(1)} near: {line.group(1).strip()}"
+
+def _read_log(log_file):
+    """Read a pdflatex log, which is not guaranteed to be valid UTF-8"""
+    try:
+        with open(log_file, errors="replace") as f:
+            return f.read()
+    except OSError:
+        return "pdflatex failed without writing a log"
+
+def _copy_output(work_dir, pdf_file):
+    """Copy the PDF of the last run in work_dir to pdf_file"""
+    output = os.path.join(work_dir, "diagram.pdf")
+    if not os.path.exists(output):
+        # pdflatex exits 0 with "No pages of output" when nothing is drawn
+        raise Exception("Error: pdflatex produced no output. Check that the diagram draws something.")
+    shutil.copyfile(output, pdf_file)
+
+class LatexRunner:
+    """Runs a fresh pdflatex process per document, for when the daemon cannot.
+    
+    Runs share one work directory so pdflatex finds its files in the page
+    cache, and are serialized by a lock because of that.
+    """
+    def __init__(self):
+        self.work_dir = tempfile.mkdtemp(prefix="bobby-", dir=LATEX_WORK_ROOT)
+        self.lock = threading.Lock()
+        self._active = None  # process currently compiling, if any
+        logging.debug(f"Created temp directory: {self.work_dir}")
+    
+    def compile(self, latex_code, pdf_file, fmt=None):
+        """Compile a LaTeX document with a fresh pdflatex process"""
+        with self.lock:
+            # Overwrite the previous document in place, and drop its output so it cannot be reused
+            Path(self.work_dir, "diagram.pdf").unlink(missing_ok=True)
+            tex_file = os.path.join(self.work_dir, "diagram.tex")
+            with open(tex_file, "w") as f:
+                f.write(latex_code)
+            logging.debug(f"Wrote LaTeX file: {tex_file}")
+            
+            # Run pdflatex, with the precompiled preamble if there is one
+            logging.info("Running pdflatex")
+            command = PDFLATEX_COMMAND + [tex_file]
+            if fmt:
+                command.insert(1, f"-fmt={fmt}")
+            process = subprocess.Popen(
+                command,
+                cwd=self.work_dir,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            self._active = process
+            try:
+                process.wait()
+            finally:
+                self._active = None
+            
+            # Only read the log when something went wrong
+            if process.returncode != 0:
+                log = _read_log(os.path.join(self.work_dir, "diagram.log"))
+                logging.debug(f"pdflatex log: {log}")
+                raise Exception(_latex_error_message(log))
+            
+            _copy_output(self.work_dir, pdf_file)
+    
+    def cancel(self):
+        """Terminate the run in progress, if any; its caller sees an error"""
+        process = self._active
+        if process is not None and process.poll() is None:
+            logging.debug("Cancelling superseded pdflatex run")
+            process.terminate()
+    
+    def close(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+def _compile_latex(latex_code, pdf_file, daemon, runner):
+    """Compile a LaTeX document to PDF, preferring the warm daemon"""
+    if not daemon.compile(latex_code, pdf_file):
+        runner.compile(latex_code, pdf_file, daemon.fmt)
+
+@lru_cache(maxsize=128)
+def _render_cached(latex_code, cache_dir, daemon, runner):
+    """Return the cached PDF for a LaTeX document, compiling it on a miss"""
+    key = hashlib.sha256(latex_code.encode()).hexdigest()
+    pdf_file = cache_dir / f"{key}.pdf"
+    
+    if pdf_file.exists():
+        logging.debug(f"Render cache hit: {key}")
+        os.utime(pdf_file)  # Mark as recently used for eviction
+        return pdf_file
+    
+    _compile_latex(latex_code, pdf_file, daemon, runner)
+    _evict_cache(cache_dir)
+    return pdf_file
+
+# PDFium is not thread-safe
+_pdfium_lock = threading.Lock()
+
+def _rasterize_pdf(pdf_file, max_width, max_height):
+    """Render the first PDF page in-process as PPM data sized to fit max_width x max_height"""
+    import pypdfium2 as pdfium  # Deferred until the first render to speed up startup
+    
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(pdf_file)
+        try:
+            page = pdf[0]
+            page_width, page_height = page.get_size()  # in points (1/72 inch)
+            scale = RENDER_DPI / 72
+            if max_width > 0 and max_height > 0:
+                # Shrink large pages to fit as well, rather than letting the canvas crop them
+                scale = min(scale, max_width / page_width, max_height / page_height)
+            bitmap = page.render(scale=scale, rev_byteorder=True)  # RGB byte order
+            
+            # Tk reads binary PPM directly, so no PIL or PNG encoding is needed
+            row_bytes = bitmap.width * bitmap.n_channels
+            pixels = bytes(bitmap.buffer)
+            if bitmap.stride != row_bytes:
+                pixels = b"".join(
+                    pixels[row * bitmap.stride:row * bitmap.stride + row_bytes]
+                    for row in range(bitmap.height)
+                )
+            return b"P6\n%d %d\n255\n" % (bitmap.width, bitmap.height) + pixels
+        finally:
+            pdf.close()
+
+@lru_cache(maxsize=IMAGE_CACHE_SIZE)
+def _render_image(latex_code, cache_dir, daemon, runner, max_width, max_height):
+    """Return PPM data for a LaTeX document at a fit size, compiling and rasterizing on a miss"""
+    return _rasterize_pdf(_render_cached(latex_code, cache_dir, daemon, runner), max_width, max_height)
+
+def _evict_cache(cache_dir, max_bytes=CACHE_MAX_BYTES):
+    """Delete the least recently used renders once the cache exceeds max_bytes"""
+    entries = [(f.stat(), f) for f in cache_dir.glob("*.pdf")]
+    total = sum(st.st_size for st, _ in entries)
+    if total <= max_bytes:
+        return
+    
+    for st, f in sorted(entries, key=lambda entry: entry[0].st_mtime):
+        if total <= max_bytes:
+            break
+        f.unlink(missing_ok=True)
+        total -= st.st_size
+    
+    # In-process entries may now point at deleted files
+    _render_cached.cache_clear()
+
+class LatexDaemon:
+    """Keeps a pdflatex process warm with the preamble already loaded.
+    
+    The process reads the document from stdin, so the preamble (and with it
+    standalone, TikZ and xcolor) is processed while the app is idle. A render
+    only feeds the document body; a fresh process is then warmed up for the
+    next one.
+    """
+    def __init__(self, preamble, timeout=60):
+        self.preamble = preamble
+        self.timeout = timeout
+        self.work_dir = tempfile.mkdtemp(prefix="bobby-latex-", dir=LATEX_WORK_ROOT)
+        self.lock = threading.Lock()
+        self.process = None
+        self._active = None  # process currently compiling, if any
+        self.fmt = None  # precompiled preamble format, used from the next spawn on
+        self._spawn()
+    
+    def _spawn(self):
+        command = ["pdflatex", "-interaction=scrollmode", "-halt-on-error", "-no-shell-escape", "-jobname=diagram"]
+        if self.fmt:
+            command.insert(1, f"-fmt={self.fmt}")
+        try:
+            self.process = subprocess.Popen(
+                command,
+                cwd=self.work_dir,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                text=True
+            )
+            self.process.stdin.write(self.preamble)
+            self.process.stdin.flush()
+        except OSError as e:
+            logging.error(f"Failed to start pdflatex daemon: {str(e)}")
+            self.process = None
+    
+    def compile(self, latex_code, pdf_file):
+        """Compile latex_code into pdf_file; returns False if the caller should fall back"""
+        if not latex_code.startswith(self.preamble):
+            return False
+        
+        with self.lock:
+            process = self.process
+            if process is None or process.poll() is not None:
+                logging.warning("pdflatex daemon not running, restarting")
+                self._spawn()
+                return False
+            
+            logging.info("Running pdflatex (daemon)")
+            Path(self.work_dir, "diagram.pdf").unlink(missing_ok=True)  # so a stale PDF cannot be reused
+            self._active = process
+            try:
+                process.communicate(latex_code[len(self.preamble):], timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                self._spawn()
+                raise Exception("Error: pdflatex timed out.")
+            finally:
+                self._active = None
+            
+            if process.returncode != 0:
+                log = _read_log(os.path.join(self.work_dir, "diagram.log"))
+                logging.debug(f"pdflatex log: {log}")
+                self._spawn()
+                raise Exception(_latex_error_message(log))
+            
+            try:
+                _copy_output(self.work_dir, pdf_file)
+            finally:
+                self._spawn()
+            return True
+    
+    def cancel(self):
+        """Terminate the compile in progress, if any; its caller sees an error"""
+        process = self._active
+        if process is not None and process.poll() is None:
+            logging.debug("Cancelling superseded pdflatex run")
+            process.terminate()
+    
+    def close(self):
+        with self.lock:
+            if self.process is not None and self.process.poll() is None:
+                self.process.kill()
+                self.process.communicate()
+            self.process = None
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
 class MessageBubble(ctk.CTkFrame):
+    # Label options shared by every bubble of each kind
+    _USER_STYLE = {
+        "fg_color": USER_BUBBLE_COLOR,
+        "text_color": "white",
+        "corner_radius": 15,
+        "justify": "left",
+        "padx": 10,
+        "pady": 5
+    }
+    _ASSISTANT_STYLE = {**_USER_STYLE, "fg_color": ASSISTANT_BUBBLE_COLOR}
+    _font = None  # one CTkFont for all bubbles, created once Tk is up
+    
     def __init__(self, parent, message, is_user=True):
         super().__init__(parent, fg_color="transparent")
+        self.is_user = is_user
         
         # Configure grid
         self.grid_columnconfigure(1 if is_user else 0, weight=1)
         self.grid_columnconfigure(0 if is_user else 1, weight=2)
         
         # Create message label
+        if MessageBubble._font is None:
+            MessageBubble._font = ctk.CTkFont(family="Helvetica", size=FONT_SIZE)
         self.message = ctk.CTkLabel(
             self,
             text=message,
             wraplength=MAX_BUBBLE_WIDTH,
-            fg_color=USER_BUBBLE_COLOR if is_user else ASSISTANT_BUBBLE_COLOR,
-            text_color="white",
-            corner_radius=15,
-            font=("Helvetica", FONT_SIZE),
-            justify="left",
-            padx=10,
-            pady=5
+            font=MessageBubble._font,
+            **(self._USER_STYLE if is_user else self._ASSISTANT_STYLE)
         )
         
         # Position the bubble
@@ -125,10 +454,17 @@ class ChatFrame(ctk.CTkScrollableFrame):
         super().__init__(parent, fg_color=DARK_BG)
         self.grid_columnconfigure(0, weight=1)
         self.messages = []
+        self._row_count = 1  # next free grid row; row 0 holds the earlier-messages button
+        self._history = []  # (text, is_user) of unrealized messages, oldest first
+        self._history_button = None
+        self._batch_depth = 0
+        self._batch_changed = False  # a message was added or updated during the batch
+        self._streaming_bubble = None  # kept at _row_count, below the last message
+        self._scroll_job = None
         
         # Loading indicator at bottom
         self.loading_frame = ctk.CTkFrame(self, fg_color=DARK_BG, height=30)
-        self.loading_frame.grid(row=1000, column=0, sticky="ew", pady=(5, 0))  # High row number to keep at bottom
+        self.loading_frame.grid(row=LOADING_ROW, column=0, sticky="ew", pady=(5, 0))  # High row number to keep at bottom
         self.loading_frame.grid_columnconfigure(0, weight=1)
         self.loading_frame.grid_propagate(False)
         
@@ -139,10 +475,98 @@ class ChatFrame(ctk.CTkScrollableFrame):
     def add_message(self, text, is_user=False):
         # Create message bubble
         bubble = MessageBubble(self, text, is_user)
-        row = len(self.messages)
-        bubble.grid(row=row, column=0, sticky="ew", pady=(0, 10))
+        bubble.grid(row=self._row_count, column=0, sticky="ew", pady=(0, 10))
+        self._row_count += 1
         self.messages.append(bubble)
-        self.smooth_scroll_to_bottom()
+        # A response still streaming, e.g. past a preview error, stays below the new bubble
+        if self._streaming_bubble is not None:
+            self._streaming_bubble.grid(row=self._row_count, column=0, sticky="ew", pady=(0, 10))
+        if len(self.messages) > MAX_CHAT_BUBBLES:
+            self._collapse_history()
+        if self._batch_depth:
+            self._batch_changed = True
+        else:
+            self.smooth_scroll_to_bottom(animate=is_user)
+    
+    def _collapse_history(self):
+        """Destroy the oldest bubbles to bound the widget count, keeping their text"""
+        old = self.messages[:CHAT_COLLAPSE_COUNT]
+        del self.messages[:CHAT_COLLAPSE_COUNT]
+        self._history.extend((bubble.message.cget("text"), bubble.is_user) for bubble in old)
+        for bubble in old:
+            bubble.destroy()
+        self._regrid_messages()
+    
+    def show_earlier(self):
+        """Re-create the most recent unrealized messages above the visible ones"""
+        # Leave a row for the streaming bubble above the loading indicator
+        count = min(CHAT_COLLAPSE_COUNT, len(self._history), LOADING_ROW - 2 - len(self.messages))
+        if count <= 0:
+            return
+        earlier = self._history[-count:]
+        del self._history[-count:]
+        self.messages[:0] = [MessageBubble(self, text, is_user) for text, is_user in earlier]
+        self._regrid_messages()
+    
+    def _regrid_messages(self):
+        """Place the realized bubbles from row 1 on and update the earlier-messages button"""
+        for row, bubble in enumerate(self.messages, start=1):
+            bubble.grid(row=row, column=0, sticky="ew", pady=(0, 10))
+        self._row_count = len(self.messages) + 1
+        
+        # A response still streaming stays directly below the last message
+        if self._streaming_bubble is not None:
+            self._streaming_bubble.grid(row=self._row_count, column=0, sticky="ew", pady=(0, 10))
+        
+        if not self._history:
+            if self._history_button is not None:
+                self._history_button.grid_remove()
+            return
+        if self._history_button is None:
+            self._history_button = ctk.CTkButton(
+                self,
+                fg_color="transparent",
+                hover_color=ASSISTANT_BUBBLE_COLOR,
+                text_color="gray60",
+                font=("Helvetica", FONT_SIZE - 4),
+                command=self.show_earlier
+            )
+        self._history_button.configure(text=f"Show earlier messages ({len(self._history)})")
+        self._history_button.grid(row=0, column=0, pady=(0, 10))
+    
+    def begin_batch(self):
+        """Defer layout and scrolling until the matching end_batch"""
+        if not self._batch_depth:
+            self.grid_propagate(False)
+        self._batch_depth += 1
+    
+    def end_batch(self):
+        self._batch_depth -= 1
+        if not self._batch_depth:
+            self.grid_propagate(True)
+            # Leave the view alone if nothing in the chat changed, e.g. for render results
+            if self._batch_changed:
+                self._batch_changed = False
+                self.update_idletasks()
+                self.smooth_scroll_to_bottom()
+    
+    def update_streaming(self, text):
+        """Show partial assistant text in a bubble that is updated in place"""
+        if self._streaming_bubble is None:
+            self._streaming_bubble = MessageBubble(self, text, is_user=False)
+            self._streaming_bubble.grid(row=self._row_count, column=0, sticky="ew", pady=(0, 10))
+        else:
+            self._streaming_bubble.message.configure(text=text)
+        if self._batch_depth:
+            self._batch_changed = True
+        else:
+            self.smooth_scroll_to_bottom()
+    
+    def finish_streaming(self):
+        """Remove the partial bubble once the final message is added"""
+        if self._streaming_bubble is not None:
+            self._streaming_bubble.destroy()
+            self._streaming_bubble = None
     
     def start_loading(self):
         self.loading_indicator.grid()
@@ -153,16 +577,31 @@ class ChatFrame(ctk.CTkScrollableFrame):
         self.loading_indicator.stop()
         self.loading_indicator.grid_remove()
 
-    def smooth_scroll_to_bottom(self):
-        """Smoothly scroll to the bottom of the chat"""
+    def smooth_scroll_to_bottom(self, animate=False):
+        """Scroll to the bottom of the chat, smoothly only when animate is set"""
+        # Restart the animation from wherever the view is now
+        self._scroll_start = float(self._parent_canvas.yview()[0])
+        self._scroll_start_time = time.perf_counter()
+        if not animate:
+            self._scroll_start_time -= SCROLL_DURATION  # Already finished, so the next step jumps
+        if self._scroll_job is None:
+            self._scroll_job = self.after_idle(self._scroll_step)
+    
+    def _scroll_step(self):
+        """Move to where the animation should be by now, independent of frame rate"""
+        self._scroll_job = None
         try:
-            current = float(self._parent_canvas.yview()[1])
-            if abs(1.0 - current) > 0.01:
-                next_pos = current + (1.0 - current) * 0.3
-                self._parent_canvas.yview_moveto(next_pos)
-                self.after(20, self.smooth_scroll_to_bottom)
-            else:
+            # Nothing to animate for a hidden window; just jump
+            if not self.winfo_viewable():
                 self._parent_canvas.yview_moveto(1.0)
+                return
+            
+            first, last = self._parent_canvas.yview()
+            target = 1.0 - (last - first)  # top of the view when scrolled to the bottom
+            progress = min(1.0, (time.perf_counter() - self._scroll_start_time) / SCROLL_DURATION)
+            self._parent_canvas.yview_moveto(self._scroll_start + (target - self._scroll_start) * progress)
+            if progress < 1.0:
+                self._scroll_job = self.after(16, self._scroll_step)  # ~60 fps
         except Exception as e:
             logging.error(f"Scroll error: {str(e)}")
             self._parent_canvas.yview_moveto(1.0)
@@ -186,53 +625,103 @@ class CodeView(ctk.CTkTextbox):
         self.tag_config("numbers", foreground=NUMBERS_COLOR)    # Blue for numbers
         self.tag_config("curly", foreground=CURLY_COLOR)      # Cyan for curly braces
         
-        # Compile regex patterns
-        self.patterns = SYNTAX_PATTERNS
-        
         # Add key bindings for editing
+        self.bind("<KeyPress>", self._mark_dirty)
         self.bind("<KeyRelease>", self.on_edit)
         
-        # Add debounce for live preview
+        # Debounced highlighting of the lines touched since the last pass
+        self._hl_timer = None
+        self._dirty_range = None
+        
+        # Add debounce for live preview; off unless the user opts in
         self.update_timer = None
         self.update_delay = UPDATE_DELAY  # ms
+        self.auto_render = ctk.BooleanVar(master=self, value=False)
+        
+        # Highlight whatever scrolls into view, once scrolling settles
+        self._scroll_timer = None
+        self._textbox.configure(yscrollcommand=self._on_yscroll)
     
     def set_code(self, code):
         self.configure(state="normal")
         self.delete("1.0", "end")
         self.insert("1.0", code)
-        self.highlight_syntax()
-    
-    def highlight_syntax(self):
-        # Process highlighting in chunks
-        for tag, pattern in self.patterns.items():
-            self.tag_remove(tag, "1.0", "end")
-            start = "1.0"
-            while True:
-                # Search for pattern
-                match = pattern.search(self.get(start, "end"))
-                if not match:
-                    break
-                
-                # Convert match position to text widget index
-                match_start = f"{start}+{match.start()}c"
-                match_end = f"{start}+{match.end()}c"
-                
-                # Add tag
-                self.tag_add(tag, match_start, match_end)
-                
-                # Move to next position
-                start = match_end
+        self.highlight_visible()
+    
+    def highlight_syntax(self, start="1.0", end="end"):
+        """Highlight the lines between start and end (the whole buffer by default)"""
+        start = self.index(f"{start} linestart")
+        text = self.get(start, end)
+        base_line = int(start.split(".")[0])
+        
+        # Offsets of each line start, so matches map straight to "line.col"
+        line_starts = [0] + [m.end() for m in NEWLINE_PATTERN.finditer(text)]
+        
+        def to_index(offset):
+            line = bisect_right(line_starts, offset) - 1
+            return f"{base_line + line}.{offset - line_starts[line]}"
+        
+        # Group ranges per tag so each tag costs a single Tk call
+        ranges = {tag: [] for tag in SYNTAX_TAGS}
+        for tag, match_start, match_end in self._tokenize(text):
+            ranges[tag].extend((to_index(match_start), to_index(match_end)))
+        
+        for tag, indices in ranges.items():
+            self.tag_remove(tag, start, end)
+            if indices:
+                # Tk's "tag add" takes any number of ranges; CTkTextbox only forwards one
+                self._textbox.tag_add(tag, *indices)
+    
+    def highlight_visible(self):
+        """Highlight only the lines currently shown in the viewport"""
+        self._scroll_timer = None
+        first = self.index("@0,0 linestart")
+        last = self.index(f"@0,{self._textbox.winfo_height()} lineend")
+        self.highlight_syntax(first, last)
+    
+    def _on_yscroll(self, first, last):
+        self._y_scrollbar.set(first, last)
+        if self._scroll_timer is not None:
+            self.after_cancel(self._scroll_timer)
+        self._scroll_timer = self.after(50, self.highlight_visible)
+    
+    def _tokenize(self, text):
+        """Yield (tag, start, end) offsets for every token in a single pass over text"""
+        for match in SYNTAX_SCAN(text):
+            yield match.lastgroup, match.start(), match.end()
     
     def on_edit(self, event):
         # Cancel previous timer if it exists
         if self.update_timer is not None:
             self.after_cancel(self.update_timer)
+            self.update_timer = None
         
         # Start new timer
-        self.update_timer = self.after(self.update_delay, self.update_preview)
+        if self.auto_render.get():
+            self.update_timer = self.after(self.update_delay, self.update_preview)
         
-        # Update syntax highlighting immediately
-        self.highlight_syntax()
+        # Re-highlight the edited lines once typing pauses
+        self._mark_dirty()
+        if self._hl_timer is not None:
+            self.after_cancel(self._hl_timer)
+        self._hl_timer = self.after(HIGHLIGHT_DELAY, self._highlight_dirty)
+    
+    def _mark_dirty(self, event=None):
+        """Extend the dirty line range to include the cursor line"""
+        line = int(self.index("insert").split(".")[0])
+        if self._dirty_range is None:
+            self._dirty_range = (line, line)
+        else:
+            self._dirty_range = (min(self._dirty_range[0], line), max(self._dirty_range[1], line))
+    
+    def _highlight_dirty(self):
+        self._hl_timer = None
+        if self._dirty_range is None:
+            return
+        first, last = self._dirty_range
+        self._dirty_range = None
+        # Include the line after the range, which Return may just have created
+        self.highlight_syntax(f"{first}.0", f"{last}.0 +1l lineend")
     
     def update_preview(self):
         # Get current code
@@ -256,43 +745,56 @@ class LoadingIndicator:
             highlightthickness=0
         )
         self.canvas.place(relx=0.5, rely=0.5, anchor="center")
-        self.angle = 0
         self.running = False
+        self._after_id = None
         
-    def draw_spinner(self):
-        size = LOADING_SIZE
-        center = size / 2
-        radius = (size - 4) / 2  # Slightly smaller than canvas
-        
-        # Clear previous drawing
-        self.canvas.delete("spinner")
+        # One pre-rendered image per rotation step; animating just swaps them
+        self.frames = self._build_frames()
+        self._frame_index = 0
+        self._sprite_id = self.canvas.create_image(
+            LOADING_SIZE / 2, LOADING_SIZE / 2, image=self.frames[0], state="hidden"
+        )
+    
+    def _build_frames(self):
+        """Draw the gradient spinner at every 10 degree rotation"""
+        from PIL import Image, ImageDraw, ImageTk
         
-        # Draw arc
-        start_angle = self.angle
+        ss = 4  # Draw oversized and scale down for smooth edges
+        size = LOADING_SIZE * ss
         extent = 300  # Leave a gap in the circle
         
         # Create gradient effect with multiple arcs
-        width = 3
+        width = 3 * ss
         segments = 8
-        for i in range(segments):
-            seg_extent = extent / segments
-            seg_start = start_angle + (i * seg_extent)
-            opacity = 0.3 + (0.7 * i / segments)  # Fade from 0.3 to 1.0
-            color = self._get_color_with_opacity(USER_BUBBLE_COLOR, opacity)
-            
-            self.canvas.create_arc(
-                2, 2, size-2, size-2,
-                start=seg_start,
-                extent=seg_extent,
-                width=width,
-                outline=color,
-                style="arc",
-                tags="spinner"
-            )
+        seg_extent = extent / segments
+        colors = [
+            self._get_color_with_opacity(USER_BUBBLE_COLOR, 0.3 + (0.7 * i / segments))  # Fade from 0.3 to 1.0
+            for i in range(segments)
+        ]
         
+        frames = []
+        for angle in range(0, 360, 10):
+            image = Image.new("RGB", (size, size), "#2B2B2B")
+            draw = ImageDraw.Draw(image)
+            for i, color in enumerate(colors):
+                seg_start = angle + (i * seg_extent)
+                # PIL measures angles clockwise, Tk counter-clockwise
+                draw.arc(
+                    (ss, ss, size - ss, size - ss),
+                    -(seg_start + seg_extent),
+                    -seg_start,
+                    fill=color,
+                    width=width
+                )
+            image = image.resize((LOADING_SIZE, LOADING_SIZE), Image.LANCZOS)
+            frames.append(ImageTk.PhotoImage(image, master=self.canvas))
+        return frames
+        
+    def draw_spinner(self):
+        self.canvas.itemconfigure(self._sprite_id, image=self.frames[self._frame_index])
+        self._frame_index = (self._frame_index + 1) % len(self.frames)
         if self.running:
-            self.angle = (self.angle + 10) % 360
-            self.canvas.after(50, self.draw_spinner)
+            self._after_id = self.canvas.after(50, self.draw_spinner)
     
     def _get_color_with_opacity(self, color, opacity):
         # Convert hex color to RGB values
@@ -310,11 +812,15 @@ class LoadingIndicator:
     def start(self):
         if not self.running:
             self.running = True
+            self.canvas.itemconfigure(self._sprite_id, state="normal")
             self.draw_spinner()
     
     def stop(self):
         self.running = False
-        self.canvas.delete("spinner")
+        if self._after_id is not None:
+            self.canvas.after_cancel(self._after_id)
+            self._after_id = None
+        self.canvas.itemconfigure(self._sprite_id, state="hidden")
     
     def grid(self, *args, **kwargs):
         self.frame.grid(*args, **kwargs)
@@ -336,26 +842,48 @@ class TikZGUI:
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
         
-        # Initialize NVIDIA API client
-        logging.info("Initializing NVIDIA API client")
-        try:
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                raise ValueError("OPENAI_API_KEY not found in environment variables")
-            
-            logging.info(f"Using API key: {api_key[:10]}...")
-            self.client = OpenAI(
-                base_url="https://integrate.api.nvidia.com/v1",
-                api_key=api_key
-            )
-            logging.info("NVIDIA API client initialized successfully")
-        except Exception as e:
-            logging.error(f"Failed to initialize NVIDIA API client: {str(e)}")
-            raise
+        # Check the NVIDIA API key; the client itself is created on the asyncio loop
+        self._api_key = os.getenv("OPENAI_API_KEY")
+        if not self._api_key:
+            logging.error("Failed to initialize NVIDIA API client: OPENAI_API_KEY not found in environment variables")
+            raise ValueError("OPENAI_API_KEY not found in environment variables")
+        logging.info(f"Using API key: {self._api_key[:10]}...")
+        self.client = None
         
         self.current_code = ""
         self.show_chat = True
         self.result_queue = queue.Queue()
+        self._stream_rendered = False  # current response's diagram already sent to render
+        
+        # One asyncio loop for all API work, kept off the Tk thread
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True, name="asyncio").start()
+        atexit.register(self._loop.call_soon_threadsafe, self._loop.stop)
+        
+        # Import openai in the background while the window comes up
+        self._loop.call_soon_threadsafe(self._create_client)
+        
+        # Rendered diagram cache
+        self.cache_dir = CACHE_DIR
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._response_cache = None
+        self._uncached_response = None  # (key, content) stored once its diagram renders
+        self._loop.call_soon_threadsafe(self._open_response_cache)
+        atexit.register(self._close_response_cache)  # runs before the loop is stopped
+        
+        # Warm pdflatex process for previews
+        self.latex_daemon = LatexDaemon(LATEX_PREAMBLE)
+        atexit.register(self.latex_daemon.close)
+        self.latex_runner = LatexRunner()  # cold fallback when the daemon cannot compile
+        atexit.register(self.latex_runner.close)
+        threading.Thread(target=self._ensure_fmt, daemon=True).start()
+        self._render_seq = 0  # bumped per preview so stale renders are dropped
+        self.render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+        self._pending_fut = None
+        self._pending_content = None  # cleaned TikZ of the newest submitted render
+        self._failed_render = None  # (cleaned TikZ, error) of the last compile that failed
+        self._shown_failure = None  # cleaned TikZ whose render error is the latest in the chat
+        atexit.register(self.render_pool.shutdown, wait=False, cancel_futures=True)
         
         self.create_gui_elements()
         
@@ -363,10 +891,68 @@ class TikZGUI:
         self.root.grid_columnconfigure(0, weight=1)
         self.root.grid_rowconfigure(0, weight=1)
         
-        # Start result checker
-        self.check_results()
+        # Drain results only when a worker signals that one is ready
+        self.root.bind("<<ResultReady>>", self._drain_queue)
         logging.info("TikZGUI initialization complete")
     
+    def _ensure_fmt(self):
+        """Build the precompiled preamble format once and hand it to the pdflatex daemon"""
+        preamble = self.latex_daemon.preamble
+        
+        # Formats only load in the TeX build that dumped them, so key on the version too
+        try:
+            version = subprocess.run(["pdflatex", "--version"], capture_output=True, text=True).stdout
+        except OSError as e:
+            logging.warning(f"Could not run pdflatex: {str(e)}")
+            return
+        key = hashlib.sha256((version + preamble).encode()).hexdigest()[:12]
+        name = f"tikz_preview-{key}"
+        fmt_file = self.cache_dir / f"{name}.fmt"
+        
+        if not fmt_file.exists():
+            # mylatexformat dumps everything up to \begin{document} into the format
+            logging.info("Building TikZ preamble format")
+            (self.cache_dir / f"{name}.tex").write_text(preamble)
+            try:
+                process = subprocess.run(
+                    ["pdflatex", "-ini", "-interaction=nonstopmode", f"-jobname={name}",
+                     "&pdflatex", "mylatexformat.ltx", f"{name}.tex"],
+                    cwd=self.cache_dir,
+                    capture_output=True,
+                    text=True
+                )
+            except OSError as e:
+                logging.warning(f"Could not build preamble format: {str(e)}")
+                return
+            if process.returncode != 0 or not fmt_file.exists():
+                logging.warning(f"Could not build preamble format: {process.stdout[-500:]}")
+                return
+        
+        # Check the format once before relying on it; renders otherwise keep the plain preamble.
+        # The check runs in its own directory so that nothing else can cancel it.
+        fmt = str(self.cache_dir / name)
+        test_code = preamble + "\\begin{tikzpicture}\\draw (0,0) -- (1,1);\\end{tikzpicture}\n\\end{document}\n"
+        with tempfile.TemporaryDirectory() as test_dir:
+            try:
+                process = subprocess.run(
+                    ["pdflatex", f"-fmt={fmt}", "-interaction=scrollmode", "-halt-on-error", "-jobname=test"],
+                    input=test_code,
+                    cwd=test_dir,
+                    capture_output=True,
+                    text=True,
+                    timeout=60
+                )
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logging.warning(f"Could not check preamble format: {str(e)}")
+                return
+        if process.returncode != 0:
+            logging.warning("Discarding unusable preamble format")
+            fmt_file.unlink(missing_ok=True)
+            return
+        
+        self.latex_daemon.fmt = fmt
+        logging.info(f"Using preamble format: {fmt_file}")
+    
     def create_gui_elements(self):
         # Configure root grid
         self.root.grid_columnconfigure(0, weight=1)
@@ -394,9 +980,34 @@ class TikZGUI:
         # Code View
         self.code_view = CodeView(self.left_frame)
         self.code_view.configure(font=("Courier", FONT_SIZE))
+        self.code_view.set_parent_gui(self)
         self.code_view.grid(row=1, column=0, sticky="nsew")
         self.code_view.grid_remove()
         
+        # Code View top bar
+        self.code_bar = ctk.CTkFrame(self.left_frame, fg_color=DARK_BG)
+        self.code_bar.grid(row=0, column=0, sticky="ew", pady=(0, 5))
+        self.code_bar.grid_columnconfigure(0, weight=1)
+        self.auto_render_check = ctk.CTkCheckBox(
+            self.code_bar,
+            text="Auto-render",
+            variable=self.code_view.auto_render,
+            font=("Helvetica", FONT_SIZE-2)
+        )
+        self.auto_render_check.grid(row=0, column=0, sticky="w", padx=5)
+        self.render_button = ctk.CTkButton(
+            self.code_bar,
+            text="Render",
+            width=80,
+            height=28,
+            fg_color=USER_BUBBLE_COLOR,
+            hover_color="#1E3EAC",
+            font=("Helvetica", FONT_SIZE-2),
+            command=self.code_view.update_preview
+        )
+        self.render_button.grid(row=0, column=1, sticky="e", padx=5)
+        self.code_bar.grid_remove()
+        
         # Resizable divider
         self.divider = ctk.CTkFrame(content_frame, width=5, fg_color="gray30")
         self.divider.grid(row=0, column=1, sticky="ns")
@@ -415,6 +1026,14 @@ class TikZGUI:
         # Canvas for diagram
         self.canvas = ctk.CTkCanvas(right_frame, bg="white", highlightthickness=0)
         self.canvas.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
+        self.canvas.bind("<Configure>", self._on_canvas_configure)
+        
+        # Single image item and PhotoImage, reused for every render
+        self._canvas_photo = tk.PhotoImage(master=self.canvas)
+        self._canvas_image_id = self.canvas.create_image(0, 0, image=self._canvas_photo, anchor="center")
+        self._displayed_code = None  # TikZ code of the diagram on the canvas
+        self._displayed_size = None  # fit size it was rasterized for
+        self._resize_timer = None
         
         # Bottom input area
         input_frame = ctk.CTkFrame(self.root, fg_color="#2B2B2B", corner_radius=15, height=50)
@@ -460,7 +1079,8 @@ class TikZGUI:
             justify="left"  # Left-aligned text
         )
         self.input_text.grid(row=0, column=3, padx=5, pady=9)
-        self.input_text.insert(0, "Describe the diagram you want to create...")
+        self.input_text.insert(0, INPUT_PLACEHOLDER)
+        self._input_is_placeholder = True
         
         # Enter button
         self.enter_button = ctk.CTkButton(
@@ -495,11 +1115,13 @@ class TikZGUI:
             
         if self.show_chat:
             self.code_view.grid_remove()
+            self.code_bar.grid_remove()
             self.chat_frame.grid(row=1, column=0, sticky="nsew")
             # Ensure latest messages are visible
             self.chat_frame.smooth_scroll_to_bottom()
         else:
             self.chat_frame.grid_remove()
+            self.code_bar.grid()
             self.code_view.grid(row=1, column=0, sticky="nsew")
             if self.current_code:
                 self.code_view.set_code(self.current_code)
@@ -528,23 +1150,27 @@ class TikZGUI:
         self.root.update_idletasks()
 
     def on_input_focus_in(self, event):
-        if self.input_text.get() == "Describe the diagram you want to create...":
+        if self._input_is_placeholder:
             self.input_text.delete(0, "end")
             self.input_text.configure(text_color="white")  # Reset to full opacity
+            self._input_is_placeholder = False
     
     def on_input_focus_out(self, event):
-        if not self.input_text.get().strip():
+        if not self._input_is_placeholder and not self.input_text.get().strip():
             self.input_text.delete(0, "end")
-            self.input_text.insert(0, "Describe the diagram you want to create...")
+            self.input_text.insert(0, INPUT_PLACEHOLDER)
             self.input_text.configure(text_color="gray70")  # Make placeholder text translucent
+            self._input_is_placeholder = True
     
     def submit_input(self, event=None):
         """Handle input submission"""
         if self.loading_indicator.running:
             return
             
+        if self._input_is_placeholder:
+            return
         text = self.input_text.get().strip()
-        if not text or text == "Describe the diagram you want to create...":
+        if not text:
             return
             
         self.chat_frame.add_message(text, is_user=True)
@@ -559,6 +1185,8 @@ class TikZGUI:
         try:
             # Get input text
             if user_input is None:
+                if self._input_is_placeholder:
+                    return
                 user_input = self.input_text.get().strip()
             if not user_input:
                 return
@@ -581,171 +1209,259 @@ Important requirements:
 """}
             ]
             
-            # Make API call
-            response = self.client.chat_completion(messages)
-            
-            # Process response
-            self.process_response(response)
+            # Make API call on the asyncio loop; it reports back via result_queue
+            self._stream_rendered = False
+            self._shown_failure = None  # a new response reports its own render errors
+            asyncio.run_coroutine_threadsafe(self.generate_diagram_async(messages), self._loop)
             
         except Exception as e:
             logging.error(f"Error generating diagram: {str(e)}")
             self.chat_frame.add_message(f"Error generating diagram: {str(e)}", is_user=False)
             self.loading_indicator.stop()
     
+    def _create_client(self):
+        """Create the NVIDIA API client; runs on the asyncio loop thread"""
+        if self.client is not None:
+            return
+        logging.info("Initializing NVIDIA API client")
+        try:
+            # Heavy imports, deferred off the startup path
+            import httpx
+            from openai import AsyncOpenAI
+            
+            # HTTP/2 keeps one multiplexed connection alive across requests
+            self.client = AsyncOpenAI(
+                base_url="https://integrate.api.nvidia.com/v1",
+                api_key=self._api_key,
+                http_client=httpx.AsyncClient(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=16, max_keepalive_connections=8)
+                )
+            )
+            logging.info("NVIDIA API client initialized successfully")
+        except Exception as e:
+            logging.error(f"Failed to initialize NVIDIA API client: {str(e)}")
+    
+    def _open_response_cache(self):
+        """Open the persistent API response cache; only the asyncio loop thread uses it"""
+        try:
+            self._response_cache = shelve.open(str(self.cache_dir / "responses"))
+        except Exception as e:
+            logging.warning(f"Response cache unavailable: {str(e)}")
+    
+    async def _close_response_cache_async(self):
+        if self._response_cache is not None:
+            self._response_cache.close()
+            self._response_cache = None
+    
+    def _close_response_cache(self):
+        """Close the response cache at exit, on the asyncio loop thread that owns it"""
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_response_cache_async(), self._loop).result(timeout=5)
+        except Exception as e:
+            logging.warning(f"Could not close response cache: {str(e)}")
+    
+    def _store_response(self, key, content):
+        """Remember a response whose diagram rendered; runs on the asyncio loop thread"""
+        if self._response_cache is not None:
+            self._response_cache[key] = content
+            self._response_cache.sync()
+    
     async def generate_diagram_async(self, messages):
         """Generate TikZ diagram asynchronously using the NVIDIA API."""
+        request = {
+            "model": "meta/llama-3.3-70b-instruct",
+            "messages": messages,
+            "temperature": 0.01,
+            "top_p": 0.7,
+            "max_tokens": 1024
+        }
+        
+        # Identical requests replay the stored response without calling the API
+        key = hashlib.sha256(repr(request).encode()).hexdigest()
+        cached = self._response_cache.get(key) if self._response_cache is not None else None
+        if cached is not None:
+            logging.info(f"Response cache hit: {key}")
+            self._post_result({"content": cached})
+            return
+        
         try:
+            self._create_client()
+            if self.client is None:
+                raise RuntimeError("NVIDIA API client is not available")
+            
             # Make API call
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model="meta/llama-3.3-70b-instruct",
-                messages=messages,
-                temperature=0.01,
-                top_p=0.7,
-                max_tokens=1024
-            )
+            completion = await self.client.chat.completions.create(**request, stream=True)
+            
+            # Stream tokens here; the main thread only sees throttled snapshots
+            parts = []
+            last_flush = time.monotonic()
+            async for chunk in completion:
+                if not chunk.choices or chunk.choices[0].delta.content is None:
+                    continue
+                parts.append(chunk.choices[0].delta.content)
+                
+                now = time.monotonic()
+                if now - last_flush > STREAM_FLUSH_INTERVAL:
+                    self._post_result({"partial": "".join(parts)})
+                    last_flush = now
             
             # Process in main thread
-            self.root.after(0, lambda: self.process_response(response))
+            # Cached only once its diagram has rendered, so bad responses are not replayed
+            self._post_result({"content": "".join(parts), "cache_key": key})
             
         except Exception as e:
             logging.error(f"Error generating diagram: {str(e)}")
-            self.root.after(0, lambda: self.handle_error(str(e)))
-        finally:
-            self.root.after(100, self.check_results)
+            self._post_result({"error": str(e)})
 
-    def render_tikz(self, tikz_code):
-        """Render TikZ code to PDF and convert to PNG"""
-        try:
-            # Create temp directory
-            temp_dir = tempfile.mkdtemp()
-            logging.debug(f"Created temp directory: {temp_dir}")
-            
-            # Extract the tikzpicture environment
-            tikz_content = tikz_code
-            if "\\begin{tikzpicture}" in tikz_code:
-                start = tikz_code.find("\\begin{tikzpicture}")
-                end = tikz_code.find("\\end{tikzpicture}") + len("\\end{tikzpicture}")
-                tikz_content = tikz_code[start:end]
-            
-            # Create LaTeX document with proper color definitions
-            latex_template = r"""\documentclass[tikz,border=10pt]{standalone}
-\usepackage{tikz}
-\usepackage[dvipsnames,svgnames,x11names]{xcolor}
-\usetikzlibrary{automata,arrows,backgrounds,fit,positioning,shapes}
-
-% Define custom colors
-\definecolor{lightblue}{RGB}{173,216,230}
-\definecolor{lightred}{RGB}{255,182,193}
-\definecolor{lightgreen}{RGB}{144,238,144}
-\definecolor{lightyellow}{RGB}{255,255,224}
-\definecolor{lightgray}{RGB}{211,211,211}
+    def _compile_to_image(self, tikz_code, max_width, max_height, cache_image=True):
+        """Compile TikZ code and rasterize it as PPM data; touches no Tk state, so any thread may call it"""
+        # Extract the tikzpicture environment
+        tikz_content = clean_tikz_code(tikz_code)
+        latex_code = LATEX_PREAMBLE + tikz_content + LATEX_EPILOGUE
+        
+        # One-off sizes, e.g. while the window is resized, would push real diagrams out of the image cache
+        if not cache_image:
+            pdf_file = _render_cached(latex_code, self.cache_dir, self.latex_daemon, self.latex_runner)
+            return _rasterize_pdf(pdf_file, max_width, max_height)
+        
+        # Compile and rasterize to fit the canvas, or reuse an identical earlier render
+        return _render_image(latex_code, self.cache_dir, self.latex_daemon, self.latex_runner, max_width, max_height)
+    
+    def _canvas_fit_size(self):
+        """Largest image size that fits the canvas, leaving 10px padding on each side"""
+        return self.canvas.winfo_width() - 20, self.canvas.winfo_height() - 20
 
-\begin{document}
-{content}
-\end{document}
-"""
-            latex_code = latex_template.replace("{content}", tikz_content)
-            
-            tex_file = os.path.join(temp_dir, "diagram.tex")
-            with open(tex_file, "w") as f:
-                f.write(latex_code)
-            logging.debug(f"Wrote LaTeX file: {tex_file}")
-            
-            # Run pdflatex
-            logging.info("Running pdflatex")
-            process = subprocess.run(
-                ["pdflatex", "-interaction=nonstopmode", tex_file],
-                cwd=temp_dir,
-                capture_output=True,
-                text=True
-            )
-            
-            if process.returncode != 0:
-                logging.error(f"pdflatex error: {process.stdout}")
-                error_msg = process.stdout
-                if "Undefined color" in error_msg:
-                    error_msg = "Error: Invalid color name used in diagram. Please use standard color names or RGB values."
-                elif "Illegal parameter" in error_msg:
-                    error_msg = "Error: Invalid TikZ parameters. Please check your node and path specifications."
-                raise Exception(error_msg)
-            
-            # Convert PDF to PNG
-            pdf_file = os.path.join(temp_dir, "diagram.pdf")
-            png_file = os.path.join(temp_dir, "diagram.png")
-            
-            dpi = 300
-            pages = convert_from_path(pdf_file, dpi)
-            pages[0].save(png_file, "PNG")
-            
-            # Load PNG into PhotoImage
-            image = Image.open(png_file)
-            photo = ImageTk.PhotoImage(image)
-            
-            # Clear canvas and display image
-            self.canvas.delete("all")
-            self.canvas.create_image(
-                self.canvas.winfo_width() / 2,
-                self.canvas.winfo_height() / 2,
-                image=photo,
-                anchor="center"
-            )
-            self.canvas.image = photo  # Keep reference
-            
-            # Clean up
-            shutil.rmtree(temp_dir)
-            return True
-            
+    def _render_job(self, tikz_code, seq, max_width, max_height, keep, cache_image):
+        """Render preview seq on a pool thread and hand the result to the main thread"""
+        tikz_content = clean_tikz_code(tikz_code)
+        failed = self._failed_render
+        try:
+            # Failures are not cached on disk, so don't run pdflatex on the same code again
+            if failed is not None and failed[0] == tikz_content:
+                raise Exception(failed[1])
+            image_data = self._compile_to_image(tikz_code, max_width, max_height, cache_image)
+            if seq == self._render_seq:
+                self._post_result({
+                    "image": image_data,
+                    "seq": seq,
+                    "code": tikz_code,
+                    "size": (max_width, max_height),
+                    "keep": keep
+                })
+            else:
+                logging.debug(f"Dropping stale render {seq}")
         except Exception as e:
-            logging.error(f"Error in render_tikz: {str(e)}")
-            self.chat_frame.add_message(f"Error rendering diagram: {str(e)}", is_user=False)
-            return False
+            # A compile cancelled for a different diagram says nothing about this one
+            if tikz_content == self._pending_content:
+                self._failed_render = (tikz_content, str(e))
+            if seq == self._render_seq:
+                logging.error(f"Error in render_tikz: {str(e)}")
+                self._post_result({"render_error": str(e), "seq": seq, "content": tikz_content})
+            else:
+                logging.debug(f"Stale render {seq} failed: {str(e)}")
 
-    def render_tikz_async(self, tikz_code):
-        # Start async task
-        threading.Thread(target=self.render_tikz, args=(tikz_code,)).start()
-    
-    def update_canvas_with_image(self, image):
-        # Clear previous image
-        self.canvas.delete("all")
+    def render_tikz_async(self, tikz_code, keep=False, cache_image=True):
+        """Render tikz_code off the Tk thread; with keep, it becomes current_code once it renders"""
+        # Newer renders supersede any still queued or in flight
+        tikz_content = clean_tikz_code(tikz_code)
+        self._render_seq += 1
+        if self._pending_fut is not None:
+            self._pending_fut.cancel()
+        # Let an identical diagram finish compiling; the new job then reuses its outcome,
+        # a cached PDF or a remembered failure
+        changed = tikz_content != self._pending_content
+        self._pending_content = tikz_content
+        if changed:
+            self.latex_daemon.cancel()
+            self.latex_runner.cancel()
         
+        # Render on the bounded pool; the canvas size is read here, on the Tk thread
+        self._pending_fut = self.render_pool.submit(
+            self._render_job, tikz_code, self._render_seq, *self._canvas_fit_size(), keep, cache_image
+        )
+    
+    def update_canvas_with_image(self, image_data):
         # Get canvas dimensions
         canvas_width = self.canvas.winfo_width()
         canvas_height = self.canvas.winfo_height()
         
         if canvas_width > 1 and canvas_height > 1:  # Canvas has been rendered
-            # Calculate scale to fit while maintaining aspect ratio
-            scale = min(
-                (canvas_width - 20) / image.width,  # Leave 10px padding on each side
-                (canvas_height - 20) / image.height
-            )
-            
-            if scale < 1:
-                new_size = (int(image.width * scale), int(image.height * scale))
-                image_resized = image.resize(new_size, Image.Resampling.LANCZOS)
-            else:
-                image_resized = image
+            # Image data is PPM already rendered at a size that fits the canvas
+            width, height = map(int, image_data.split(b"\n", 2)[1].split())
             
-            # Convert to PhotoImage
-            photo = ImageTk.PhotoImage(image_resized)
-            
-            # Calculate position to center the image
-            x = (canvas_width - photo.width()) // 2
-            y = (canvas_height - photo.height()) // 2
-            
-            # Create image on canvas
-            self.canvas.create_image(x, y, image=photo, anchor="nw")
-            # Keep a reference to prevent garbage collection
-            self.canvas._photo = photo
+            # Resize the existing PhotoImage and load the new pixels into it
+            self._canvas_photo.configure(width=width, height=height)
+            self._canvas_photo.configure(data=image_data)
+            self._center_canvas_image()
             
             logging.info("Successfully updated canvas with new image")
     
+    def _on_canvas_configure(self, event=None):
+        self._center_canvas_image()
+        
+        # Re-rasterize for the new size once resizing settles; the PDF comes from the cache
+        if self._displayed_code is not None:
+            if self._resize_timer is not None:
+                self.root.after_cancel(self._resize_timer)
+            self._resize_timer = self.root.after(RESIZE_DELAY, self._rerender_for_size)
+    
+    def _rerender_for_size(self):
+        self._resize_timer = None
+        if self._canvas_fit_size() == self._displayed_size:
+            return
+        if self._pending_fut is not None and not self._pending_fut.done():
+            # A newer diagram is on its way; check again after it lands
+            self._resize_timer = self.root.after(RESIZE_DELAY, self._rerender_for_size)
+            return
+        self.render_tikz_async(self._displayed_code, cache_image=False)
+    
+    def _center_canvas_image(self, event=None):
+        self.canvas.coords(
+            self._canvas_image_id,
+            self.canvas.winfo_width() // 2,
+            self.canvas.winfo_height() // 2
+        )
+    
     def update_ui_with_result(self, result):
+        # Preview renders may finish after a newer one was requested
+        if "image" in result or "render_error" in result:
+            if result["seq"] != self._render_seq:
+                return
+            if "image" in result:
+                self.update_canvas_with_image(result["image"])
+                self._displayed_code = result["code"]
+                self._displayed_size = result["size"]
+                self._shown_failure = None
+                if result["keep"]:
+                    self.current_code = result["code"]
+                    if self._uncached_response is not None:
+                        self._loop.call_soon_threadsafe(self._store_response, *self._uncached_response)
+                        self._uncached_response = None
+            else:
+                self._uncached_response = None
+                # A repeat of the same failure, e.g. the final render of a stream, adds no bubble
+                if result["content"] != self._shown_failure:
+                    self._shown_failure = result["content"]
+                    self.chat_frame.add_message(f"Error rendering diagram: {result['render_error']}", is_user=False)
+            return
+        
         if "error" in result:
+            self.chat_frame.finish_streaming()
             error_message = f"Error: {result['error']}"
             self.chat_frame.add_message(error_message, is_user=False)
             self.loading_indicator.stop()
             return
+        
+        if "partial" in result:
+            self.chat_frame.update_streaming(result["partial"])
+            self._stream_partial_code(result["partial"])
+            return
+        
+        if "content" in result:
+            self.chat_frame.finish_streaming()
+            self.process_response(result["content"], result.get("cache_key"))
+            return
 
         try:
             tikz_code = result["tikz_code"]
@@ -769,50 +1485,73 @@ Important requirements:
             # Stop loading indicator
             self.loading_indicator.stop()
 
-    def check_results(self):
+    def _stream_partial_code(self, content):
+        """Mirror the TikZ block of a partial response and render it once it closes"""
+        match = TIKZ_BLOCK.search(content)
+        if match is None:
+            return
+        tikz_code = match.group(1).strip()
+        
+        if not self.show_chat:
+            self.code_view.set_code(tikz_code)
+        
+        # Start compiling as soon as the picture is complete, before the stream ends
+        if not self._stream_rendered and "\\end{tikzpicture}" in tikz_code:
+            self._stream_rendered = True
+            self.render_tikz_async(tikz_code)
+    
+    def _post_result(self, result):
+        """Queue a result from a worker thread and wake the main thread"""
+        self.result_queue.put(result)
+        self.root.event_generate("<<ResultReady>>", when="tail")
+    
+    def _drain_queue(self, event=None):
+        # Lay out the chat once for everything that arrived
+        self.chat_frame.begin_batch()
         try:
-            while True:
-                result = self.result_queue.get_nowait()
+            results = []
+            try:
+                while True:
+                    results.append(self.result_queue.get_nowait())
+            except queue.Empty:
+                pass
+            
+            for i, result in enumerate(results):
+                # Partials are cumulative, so only the newest one matters
+                if "partial" in result and i + 1 < len(results):
+                    continue
                 self.update_ui_with_result(result)
-        except queue.Empty:
-            pass
         finally:
-            self.root.after(100, self.check_results)
+            self.chat_frame.end_batch()
 
     def process_input_async(self, text):
         self.generate_diagram(text)
 
-    def process_response(self, response):
-        """Process the API response"""
+    def process_response(self, content, cache_key=None):
+        """Process the assistant's response text"""
         try:
-            # Extract the assistant's response
-            content = response.choices[0].message.content
-            
             # Extract TikZ code from the response
-            tikz_code = None
-            if "```tikz" in content:
-                start = content.find("```tikz") + 6
-                end = content.find("```", start)
-                tikz_code = content[start:end].strip()
+            match = TIKZ_BLOCK.search(content)
+            tikz_code = match.group(1).strip() if match else None
             
             # Add only the text response to chat (excluding the code)
             text_response = content
-            if tikz_code:
-                # Get everything before the code block
-                pre_code = content[:content.find("```tikz")].strip()
-                # Get everything after the code block
-                post_code = content[content.find("```", start) + 3:].strip()
-                # Combine non-code parts
+            if match:
+                # Combine the text before and after the code block
+                pre_code = content[:match.start()].strip()
+                post_code = content[match.end():].strip()
                 text_response = f"{pre_code}\n\n{post_code}".strip()
             
             if text_response:
                 self.chat_frame.add_message(text_response, is_user=False)
             
-            # If we have TikZ code, try to render it
+            # If we have TikZ code, render it; it becomes current_code once it renders
             if tikz_code:
-                success = self.render_tikz(tikz_code)
-                if success:
-                    self.current_code = tikz_code
+                # Streamed partials may have stopped short of the final tokens
+                if not self.show_chat:
+                    self.code_view.set_code(tikz_code)
+                self._uncached_response = (cache_key, content) if cache_key is not None else None
+                self.render_tikz_async(tikz_code, keep=True)
                 
             self.loading_indicator.stop()
             